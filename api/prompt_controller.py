@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import openai
+from types import MappingProxyType
 import os
+import json
 from dotenv import load_dotenv
 import time
 
@@ -18,8 +20,14 @@ from prompt import (
 # 导入日志工具
 from utils.logger_utils import logger, log_api_call
 
-# 中文到英文维度的映射字典
-DIMENSION_MAPPING = {
+# 导入大模型调用工具
+from utils.llm_utils import (
+    ConcurrencyLimitError, create_chat_completion, get_client, count_tokens_async, get_context_window, model_slot
+)
+from utils.llm_cache import llm_cache
+
+# 中文到英文维度的映射字典（只读）
+DIMENSION_MAPPING = MappingProxyType({
     "清晰度与特异性": "Clarity & Specificity",
     "上下文背景提供": "Context / Background Provided",
     "任务定义明确性": "Explicit Task Definition",
@@ -55,7 +63,7 @@ DIMENSION_MAPPING = {
     "情感共鸣校准": "Emotional Resonance Calibration",
     "输出风险分类": "Output Risk Categorization",
     "自我修复循环": "Self-Repair Loops"
-}
+})
 
 # 1. Clarity & Specificity  
 # 2. Context / Background Provided  
@@ -93,8 +101,252 @@ DIMENSION_MAPPING = {
 # 34. Output Risk Categorization
 # 35. Self-Repair Loops
 
+class PromptEvaluationRequest(BaseModel):
+    """提示词评估请求参数"""
+    prompt_content: str = ""
+    dimensions: List[str] = []
+    force_refresh: bool = False  # 跳过响应缓存，强制重新生成
+    stream: bool = False  # 以 SSE 流式返回结果
+
+
+class PromptRefinementRequest(BaseModel):
+    """提示词优化请求参数"""
+    prompt_content: str = ""
+    evaluation_result: str = ""
+    force_refresh: bool = False  # 跳过响应缓存，强制重新生成
+    stream: bool = False  # 以 SSE 流式返回结果
+
+
 router = APIRouter()
 
+# 模型调用参数
+MODEL_TEMPERATURE = 0.3
+MODEL_MAX_TOKENS = 20000
+
+# 上下文窗口预留的安全余量，以及可接受的最少输出 token 数
+CONTEXT_SAFETY_MARGIN = 256
+MIN_OUTPUT_TOKENS = 1024
+
+
+def _build_messages(system_prompt: str, user_message: str) -> list:
+    """构建模型对话消息"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message}
+    ]
+
+
+def _output_token_budget(model_name: str, input_tokens: int) -> int:
+    """
+    计算本次调用的输出 token 上限，输入过长时在调用模型前直接拒绝
+    
+    Args:
+        model_name: 模型名称
+        input_tokens: 输入 token 数
+        
+    Returns:
+        输出 token 上限
+    """
+    context_window = get_context_window(model_name)
+    budget = context_window - input_tokens - CONTEXT_SAFETY_MARGIN
+    if budget < MIN_OUTPUT_TOKENS:
+        logger.error(f"输入内容过长: {input_tokens} tokens，模型上下文窗口 {context_window} tokens")
+        raise HTTPException(
+            status_code=413,
+            detail=f"输入内容过长: {input_tokens} tokens，超出模型上下文窗口 {context_window} tokens"
+        )
+    return min(MODEL_MAX_TOKENS, budget)
+
+
+async def _call_model(operation: str, model_name: str, system_prompt: str, user_message: str,
+                      input_tokens: int, max_tokens: int) -> str:
+    """
+    调用大模型并记录推理日志
+    
+    Args:
+        operation: 业务操作名称，用于日志
+        model_name: 模型名称
+        system_prompt: 系统提示词
+        user_message: 用户消息
+        input_tokens: 输入 token 数
+        max_tokens: 输出 token 上限
+        
+    Returns:
+        模型输出内容，无输出时为空字符串
+    """
+    logger.business_logic(operation, "获取OpenAI客户端")
+    client = get_client()
+    
+    # 记录模型推理开始
+    logger.model_inference(model_name, input_tokens=input_tokens)
+    
+    start_time = time.time()
+    async with model_slot(model_name):
+        response = await create_chat_completion(
+            client,
+            model=model_name,
+            messages=_build_messages(system_prompt, user_message),
+            temperature=MODEL_TEMPERATURE,
+            max_tokens=max_tokens
+        )
+    response_time = time.time() - start_time
+    
+    # 模型可能返回 None，统一为空字符串，后续长度与预览计算无需再判空
+    result = response.choices[0].message.content or ""
+    
+    # 记录模型推理结果，优先使用接口返回的实际 token 用量
+    usage = getattr(response, "usage", None)
+    logger.model_inference(
+        model_name, 
+        input_tokens=usage.prompt_tokens if usage else input_tokens,
+        output_tokens=usage.completion_tokens if usage else await count_tokens_async(result, model_name),
+        response_time=response_time
+    )
+    return result
+
+
+def _sse_event(data) -> str:
+    """将数据编码为一条 SSE 消息"""
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False)
+    return f"data: {payload}\n\n"
+
+
+async def _stream_model(operation: str, model_name: str, system_prompt: str, user_message: str,
+                        input_tokens: int, max_tokens: int, cache_key: str, refresh: bool = False):
+    """
+    以 SSE 格式流式输出模型结果，生成结束后写入响应缓存
+    
+    相同请求正在生成时等待其结果并一次性输出，不重复调用模型。
+    第一次 yield 的 None 为就绪信号：此时已命中缓存、已在等待相同请求或已获取模型并发名额，由 _open_stream 预先消费；
+    之后每条消息为 {"delta": 增量文本}，出错时为 {"error": 错误信息}，正常结束时发送 [DONE]
+    
+    Args:
+        operation: 业务操作名称，用于日志
+        model_name: 模型名称
+        system_prompt: 系统提示词
+        user_message: 用户消息
+        input_tokens: 输入 token 数
+        max_tokens: 输出 token 上限
+        cache_key: 响应缓存键
+        refresh: 是否跳过缓存强制重新生成
+    """
+    if not refresh and llm_cache.get(cache_key) is None and llm_cache.is_computing(cache_key):
+        # 相同请求正在生成中，等待其结果后一次性输出，不再重复调用模型
+        yield None
+        try:
+            result = await llm_cache.get_or_compute(
+                cache_key,
+                lambda: _call_model(operation, model_name, system_prompt, user_message, input_tokens, max_tokens)
+            )
+            yield _sse_event({"delta": result})
+            logger.business_logic(operation, "流式输出完成")
+            yield _sse_event("[DONE]")
+        except Exception as e:
+            logger.error(f"{operation} 流式输出失败: {str(e)}")
+            logger.api_error(f"/{operation}", "POST", str(e), type(e).__name__)
+            yield _sse_event({"error": str(e)})
+        return
+    
+    cached_result = None if refresh else llm_cache.get(cache_key)
+    if cached_result is not None:
+        yield None
+        logger.business_logic(operation, "命中响应缓存")
+        yield _sse_event({"delta": cached_result})
+        logger.business_logic(operation, "流式输出完成")
+        yield _sse_event("[DONE]")
+        return
+    
+    # 先登记为进行中的计算，使排队等待名额期间到达的相同请求也能合并；
+    # 流式输出期间模型仍在生成，需持有并发名额直到读取结束
+    async with llm_cache.computing(cache_key) as future, model_slot(model_name):
+        yield None
+        try:
+            logger.business_logic(operation, "获取OpenAI客户端")
+            client = get_client()
+            
+            # 记录模型推理开始
+            logger.model_inference(model_name, input_tokens=input_tokens)
+            
+            start_time = time.time()
+            parts = []
+            stream = await create_chat_completion(
+                client,
+                model=model_name,
+                messages=_build_messages(system_prompt, user_message),
+                temperature=MODEL_TEMPERATURE,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield _sse_event({"delta": delta})
+            response_time = time.time() - start_time
+            
+            # 通知等待中的相同请求，退出时写入响应缓存
+            result = "".join(parts)
+            future.set_result(result)
+            
+            # 记录模型推理结果
+            logger.model_inference(
+                model_name,
+                input_tokens=input_tokens,
+                output_tokens=await count_tokens_async(result, model_name),
+                response_time=response_time
+            )
+            
+            logger.business_logic(operation, "流式输出完成")
+            yield _sse_event("[DONE]")
+        
+        except Exception as e:
+            # 等待中的相同请求收到同一异常
+            if not future.done():
+                future.set_exception(e)
+            # 响应头已发送，错误只能通过事件通知前端
+            logger.error(f"{operation} 流式输出失败: {str(e)}")
+            logger.api_error(f"/{operation}", "POST", str(e), type(e).__name__)
+            yield _sse_event({"error": str(e)})
+
+
+async def _open_stream(operation: str, model_name: str, system_prompt: str, user_message: str,
+                       input_tokens: int, max_tokens: int, cache_key: str, refresh: bool = False) -> StreamingResponse:
+    """
+    创建流式响应，在发送响应头之前完成缓存检查与并发名额获取
+    
+    名额不足时 ConcurrencyLimitError 在此抛出，由接口返回 503，而不是在已返回 200 的流中报错
+    
+    Args:
+        operation: 业务操作名称，用于日志
+        model_name: 模型名称
+        system_prompt: 系统提示词
+        user_message: 用户消息
+        input_tokens: 输入 token 数
+        max_tokens: 输出 token 上限
+        cache_key: 响应缓存键
+        refresh: 是否跳过缓存强制重新生成
+        
+    Returns:
+        SSE 流式响应
+    """
+    events = _stream_model(operation, model_name, system_prompt, user_message,
+                           input_tokens, max_tokens, cache_key, refresh)
+    # 推进到就绪信号；生成器已启动，即使客户端提前断开，事件循环回收时也会执行清理并释放名额
+    await events.__anext__()
+    return _streaming_response(events)
+
+
+def _streaming_response(events) -> StreamingResponse:
+    """构建 SSE 流式响应，关闭代理缓冲以便增量内容及时送达"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # 测试端点
 @router.get("/test")
 @log_api_call("/test", "GET")
@@ -114,14 +366,16 @@ async def test_endpoint():
 # 使用 get_prompt_evaluation(dimensions) 获取系统提示词， prompt_content 作为消息 请求大模型 获取结果
 @router.post("/prompt_evaluation")
 @log_api_call("/prompt_evaluation", "POST")
-async def prompt_evaluation(request: dict = Body(...)):
+async def prompt_evaluation(request: PromptEvaluationRequest):
     try:
         # 记录业务逻辑开始
         logger.business_logic("prompt_evaluation", "开始处理提示词评估请求")
         
         # 提取请求参数
-        prompt_content = request.get("prompt_content", "")
-        dimensions = request.get("dimensions", [])
+        prompt_content = request.prompt_content
+        dimensions = request.dimensions
+        force_refresh = request.force_refresh
+        stream = request.stream
         
         # 记录参数信息
         logger.parameters(
@@ -131,56 +385,42 @@ async def prompt_evaluation(request: dict = Body(...)):
         )
         
         if not prompt_content:
-            logger.error("prompt_evaluation", "prompt_content 参数为空")
+            logger.error("prompt_evaluation prompt_content 参数为空")
             raise HTTPException(status_code=400, detail="prompt_content 参数不能为空")
         
         if not dimensions:
-            logger.error("prompt_evaluation", "dimensions 参数为空")
+            logger.error("prompt_evaluation dimensions 参数为空")
             raise HTTPException(status_code=400, detail="dimensions 参数不能为空")
         
         # 将英文维度数组转换为字符串格式，用于提示词模板
-        dimensions_str = "\n".join([f"{i+1}. {dim}" for i, dim in enumerate(dimensions)])
+        dimensions_str = "\n".join(f"{i}. {dim}" for i, dim in enumerate(dimensions, 1))
         
         # 获取系统提示词
         logger.business_logic("prompt_evaluation", "获取系统提示词")
         system_prompt = get_prompt_evaluation(dimensions_str)
+        user_message = f"```\n{prompt_content}\n```"
         
-        # 调用OpenAI API
-        logger.business_logic("prompt_evaluation", "初始化OpenAI客户端")
-        client = openai.OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-        )
-        
-        # 记录模型推理开始
+        # 调用大模型，相同模型和提示词优先复用缓存结果
         model_name = os.getenv("OPENAI_API_MODEL", "gpt-4o")
-        logger.model_inference(model_name, input_tokens=len(prompt_content) + len(system_prompt))
+        cache_key = llm_cache.make_key(model_name, system_prompt, user_message)
         
-        start_time = time.time()
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"```\n{prompt_content}\n```"}
-            ],
-            temperature=0.3,
-            max_tokens=20000
-        )
-        response_time = time.time() - start_time
-        
-        evaluation_result = response.choices[0].message.content
+        # 预先计算输入 token 数，超出上下文窗口时直接拒绝，避免无效的模型调用
+        input_tokens = await count_tokens_async(system_prompt + user_message, model_name)
+        max_tokens = _output_token_budget(model_name, input_tokens)
         
-        # 记录模型推理结果
-        logger.model_inference(
-            model_name, 
-            input_tokens=len(prompt_content) + len(system_prompt),
-            output_tokens=len(evaluation_result) if evaluation_result else 0,
-            response_time=response_time
+        if stream:
+            logger.business_logic("prompt_evaluation", "以流式方式返回结果")
+            return await _open_stream("prompt_evaluation", model_name, system_prompt, user_message,
+                                      input_tokens, max_tokens, cache_key, force_refresh)
+        evaluation_result = await llm_cache.get_or_compute(
+            cache_key,
+            lambda: _call_model("prompt_evaluation", model_name, system_prompt, user_message, input_tokens, max_tokens),
+            refresh=force_refresh
         )
         
         # 记录评估结果信息
-        logger.info(f"评估完成 - 结果长度: {len(evaluation_result) if evaluation_result else 0}")
-        logger.debug(f"评估结果预览: {evaluation_result[:200] if evaluation_result else 'None'}...")
+        logger.info(f"评估完成 - 结果长度: {len(evaluation_result)}")
+        logger.debug(f"评估结果预览: {evaluation_result[:200]}...")
         
         # 记录成功完成
         logger.business_logic("prompt_evaluation", "评估请求处理完成")
@@ -191,6 +431,13 @@ async def prompt_evaluation(request: dict = Body(...)):
             "message": "评估完成"
         }
         
+    except HTTPException:
+        # 参数校验等已明确状态码的异常直接抛出
+        raise
+    except ConcurrencyLimitError as e:
+        # 模型并发已满，提示客户端稍后重试
+        logger.api_error("/prompt_evaluation", "POST", str(e), type(e).__name__)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # 记录错误信息
         logger.error(f"prompt_evaluation 处理失败: {str(e)}")
@@ -204,14 +451,16 @@ async def prompt_evaluation(request: dict = Body(...)):
 # 使用 get_prompt_refinement() 获取系统提示词， evaluation_result 和 prompt_content 作为消息 请求大模型 获取结果
 @router.post("/prompt_refinement")
 @log_api_call("/prompt_refinement", "POST")
-async def prompt_refinement(request: dict = Body(...)):
+async def prompt_refinement(request: PromptRefinementRequest):
     try:
         # 记录业务逻辑开始
         logger.business_logic("prompt_refinement", "开始处理提示词优化请求")
         
         # 提取请求参数
-        prompt_content = request.get("prompt_content", "")
-        evaluation_result = request.get("evaluation_result", "")
+        prompt_content = request.prompt_content
+        evaluation_result = request.evaluation_result
+        force_refresh = request.force_refresh
+        stream = request.stream
         
         # 记录参数信息
         logger.parameters(
@@ -220,11 +469,11 @@ async def prompt_refinement(request: dict = Body(...)):
         )
         
         if not prompt_content:
-            logger.error("prompt_refinement", "prompt_content 参数为空")
+            logger.error("prompt_refinement prompt_content 参数为空")
             raise HTTPException(status_code=400, detail="prompt_content 参数不能为空")
         
         if not evaluation_result:
-            logger.error("prompt_refinement", "evaluation_result 参数为空")
+            logger.error("prompt_refinement evaluation_result 参数为空")
             raise HTTPException(status_code=400, detail="evaluation_result 参数不能为空")
         
         # 获取系统提示词
@@ -234,42 +483,27 @@ async def prompt_refinement(request: dict = Body(...)):
         # 构建用户消息，包含评估结果和原始提示词
         user_message = f"评估报告：\n{evaluation_result}\n\n原始提示词：\n```\n{prompt_content}\n```"
         
-        # 调用OpenAI API
-        logger.business_logic("prompt_refinement", "初始化OpenAI客户端")
-        client = openai.OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-        )
-        
-        # 记录模型推理开始
+        # 调用大模型，相同模型和提示词优先复用缓存结果
         model_name = os.getenv("OPENAI_API_MODEL", "gpt-4o")
-        logger.model_inference(model_name, input_tokens=len(user_message) + len(system_prompt))
+        cache_key = llm_cache.make_key(model_name, system_prompt, user_message)
         
-        start_time = time.time()
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.3,
-            max_tokens=20000
-        )
-        response_time = time.time() - start_time
+        # 预先计算输入 token 数，超出上下文窗口时直接拒绝，避免无效的模型调用
+        input_tokens = await count_tokens_async(system_prompt + user_message, model_name)
+        max_tokens = _output_token_budget(model_name, input_tokens)
         
-        refinement_result = response.choices[0].message.content
-        
-        # 记录模型推理结果
-        logger.model_inference(
-            model_name, 
-            input_tokens=len(user_message) + len(system_prompt),
-            output_tokens=len(refinement_result) if refinement_result else 0,
-            response_time=response_time
+        if stream:
+            logger.business_logic("prompt_refinement", "以流式方式返回结果")
+            return await _open_stream("prompt_refinement", model_name, system_prompt, user_message,
+                                      input_tokens, max_tokens, cache_key, force_refresh)
+        refinement_result = await llm_cache.get_or_compute(
+            cache_key,
+            lambda: _call_model("prompt_refinement", model_name, system_prompt, user_message, input_tokens, max_tokens),
+            refresh=force_refresh
         )
         
         # 记录优化结果信息
-        logger.info(f"优化完成 - 结果长度: {len(refinement_result) if refinement_result else 0}")
-        logger.debug(f"优化结果预览: {refinement_result[:200] if refinement_result else 'None'}...")
+        logger.info(f"优化完成 - 结果长度: {len(refinement_result)}")
+        logger.debug(f"优化结果预览: {refinement_result[:200]}...")
         
         # 记录成功完成
         logger.business_logic("prompt_refinement", "优化请求处理完成")
@@ -280,6 +514,13 @@ async def prompt_refinement(request: dict = Body(...)):
             "message": "优化完成"
         }
         
+    except HTTPException:
+        # 参数校验等已明确状态码的异常直接抛出
+        raise
+    except ConcurrencyLimitError as e:
+        # 模型并发已满，提示客户端稍后重试
+        logger.api_error("/prompt_refinement", "POST", str(e), type(e).__name__)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # 记录错误信息
         logger.error(f"prompt_refinement 处理失败: {str(e)}")
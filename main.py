@@ -1,10 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import HTMLResponse
 import uvicorn
 from dotenv import load_dotenv
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from pygelf import GelfUdpHandler
 from datetime import datetime
 
@@ -62,9 +65,16 @@ def setup_logging():
         graylog_formatter = logging.Formatter('%(message)s')
         graylog_handler.setFormatter(graylog_formatter)
         
+        # 请求线程只把日志记录放入队列，由后台线程统一发送 UDP，避免发送耗时阻塞事件循环
+        log_queue = queue.SimpleQueue()
+        listener = QueueListener(log_queue, graylog_handler, respect_handler_level=True)
+        listener.start()
+        # 进程退出时停止监听线程，确保队列中剩余的日志发送完毕
+        atexit.register(listener.stop)
+        
         # 设置根日志记录器的传播属性，确保所有子记录器都使用相同的处理器
         root_logger.propagate = True
-        root_logger.addHandler(graylog_handler)
+        root_logger.addHandler(QueueHandler(log_queue))
 
     except Exception as e:
         print(f"错误详情: {type(e).__name__}: {e}")
@@ -105,14 +115,15 @@ from api.prompt_controller import router as prompt_router
 app.include_router(prompt_router, prefix="/api", tags=["prompt"])
 
 # 静态文件服务
-app.mount("/static", StaticFiles(directory="static"), name="static")
+static_files = StaticFiles(directory="static")
+app.mount("/static", static_files, name="static")
 
 @app.get("/", response_class=HTMLResponse)
 @log_api_call('/', 'GET')
-async def read_root():
-    """返回主页面"""
-    with open("static/index.html", "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+async def read_root(request: Request):
+    """返回主页面，由静态文件服务在线程池中读取文件，并按 ETag/Last-Modified 处理条件请求"""
+    return await static_files.get_response("index.html", request.scope)
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=9080)
+    # loop="auto" 在已安装 uvloop 时自动使用，未安装的平台（如 Windows）退回 asyncio
+    uvicorn.run(app, host="127.0.0.1", port=9080, loop="auto")
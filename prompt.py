@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 prompt_list = {
 
 "prompt_evaluation":"""
@@ -192,10 +194,13 @@ You are a **senior prompt engineer** participating in the **Prompt Refinement Ch
 
 
 
+# 模板渲染结果只取决于入参，缓存后相同维度组合无需重复格式化
+@lru_cache(maxsize=512)
 def get_prompt_evaluation(dimensions: str) -> str:
     """获取对话摘要提示词"""
     return prompt_list["prompt_evaluation"].format(dimensions=dimensions)
 
+@lru_cache(maxsize=1)
 def get_prompt_refinement() -> str:
     """获取会话摘要提示词"""
     return prompt_list["prompt_refinement"].format()
\ No newline at end of file
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+大模型响应缓存测试
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from utils import llm_cache
+from utils.llm_cache import LLMCache
+
+
+class LLMCacheTest(unittest.TestCase):
+    """缓存读写、过期与淘汰测试"""
+
+    def test_make_key_separates_parts(self):
+        self.assertNotEqual(LLMCache.make_key("m", "ab", "c"), LLMCache.make_key("m", "a", "bc"))
+        self.assertEqual(LLMCache.make_key("m", "a"), LLMCache.make_key("m", "a"))
+
+    def test_entry_expires_after_ttl(self):
+        cache = LLMCache(maxsize=4, ttl=10)
+        with mock.patch.object(llm_cache.time, "monotonic", return_value=100.0):
+            cache.set("k", "v")
+        with mock.patch.object(llm_cache.time, "monotonic", return_value=109.0):
+            self.assertEqual(cache.get("k"), "v")
+        with mock.patch.object(llm_cache.time, "monotonic", return_value=111.0):
+            self.assertIsNone(cache.get("k"))
+        self.assertNotIn("k", cache._data)
+
+    def test_evicts_least_recently_used(self):
+        cache = LLMCache(maxsize=2, ttl=60)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        # 读取 a 使其成为最近使用的条目，随后写入 c 时淘汰 b
+        cache.get("a")
+        cache.set("c", "3")
+        self.assertEqual(cache.get("a"), "1")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "3")
+
+
+class GetOrComputeTest(unittest.IsolatedAsyncioTestCase):
+    """get_or_compute 缓存与合并并发请求测试"""
+
+    async def test_caches_result(self):
+        cache = LLMCache()
+        compute = mock.AsyncMock(return_value="v")
+        self.assertEqual(await cache.get_or_compute("k", compute), "v")
+        self.assertEqual(await cache.get_or_compute("k", compute), "v")
+        self.assertEqual(compute.await_count, 1)
+
+    async def test_refresh_recomputes(self):
+        cache = LLMCache()
+        compute = mock.AsyncMock(side_effect=["v1", "v2"])
+        await cache.get_or_compute("k", compute)
+        self.assertEqual(await cache.get_or_compute("k", compute, refresh=True), "v2")
+        self.assertEqual(cache.get("k"), "v2")
+
+    async def test_empty_result_is_not_cached(self):
+        cache = LLMCache()
+        await cache.get_or_compute("k", mock.AsyncMock(return_value=""))
+        self.assertIsNone(cache.get("k"))
+
+    async def test_concurrent_requests_share_one_compute(self):
+        cache = LLMCache()
+        release = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "v"
+
+        tasks = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["v", "v", "v"])
+        self.assertEqual(calls, 1)
+        self.assertEqual(cache._inflight, {})
+
+    async def test_waiters_receive_compute_error(self):
+        cache = LLMCache()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            raise ValueError("boom")
+
+        tasks = [asyncio.create_task(cache.get_or_compute("k", compute)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_waiter_recomputes_when_leader_cancelled(self):
+        cache = LLMCache()
+        started = asyncio.Event()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                started.set()
+                await asyncio.Event().wait()  # 领头请求一直挂起，直到被取消
+            return "v"
+
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await started.wait()
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        self.assertEqual(await waiter, "v")
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(calls, 2)
+        self.assertEqual(cache.get("k"), "v")
+
+    async def test_cancelled_waiter_does_not_cancel_leader(self):
+        cache = LLMCache()
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return "v"
+
+        leader = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        self.assertEqual(await leader, "v")
+
+
+class ComputingTest(unittest.IsolatedAsyncioTestCase):
+    """computing 登记进行中计算的测试"""
+
+    async def test_waiter_receives_result_and_result_is_cached(self):
+        cache = LLMCache()
+        async with cache.computing("k") as future:
+            self.assertTrue(cache.is_computing("k"))
+            waiter = asyncio.create_task(cache.get_or_compute("k", mock.AsyncMock(return_value="other")))
+            await asyncio.sleep(0)
+            future.set_result("v")
+            self.assertEqual(await waiter, "v")
+        self.assertFalse(cache.is_computing("k"))
+        self.assertEqual(cache.get("k"), "v")
+
+    async def test_waiter_recomputes_when_exited_without_result(self):
+        cache = LLMCache()
+        compute = mock.AsyncMock(return_value="v")
+        async with cache.computing("k"):
+            waiter = asyncio.create_task(cache.get_or_compute("k", compute))
+            await asyncio.sleep(0)
+        self.assertEqual(await waiter, "v")
+        self.assertEqual(compute.await_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+大模型调用工具类测试
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+import openai
+
+from utils import llm_utils
+
+
+def _make_error(error_type):
+    """构造不依赖 HTTP 请求/响应对象的 openai 异常"""
+    error = error_type.__new__(error_type)
+    error.response = None
+    return error
+
+
+class _FakeEncoding:
+    """按空格切分的假编码器"""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+class CountTokensTest(unittest.TestCase):
+    """token 计数与编码器加载测试"""
+
+    def setUp(self):
+        llm_utils._encodings.clear()
+        llm_utils._encoding_failed_at.clear()
+
+    def tearDown(self):
+        llm_utils._encodings.clear()
+        llm_utils._encoding_failed_at.clear()
+
+    def test_falls_back_to_char_count_when_encoding_unavailable(self):
+        with mock.patch.object(llm_utils.tiktoken, "encoding_for_model", side_effect=OSError("offline")):
+            self.assertEqual(llm_utils.count_tokens("hello world", "gpt-4o"), len("hello world"))
+
+    def test_failed_load_is_retried_after_interval(self):
+        with mock.patch.object(llm_utils.tiktoken, "encoding_for_model",
+                               side_effect=[OSError("offline"), _FakeEncoding()]) as loader:
+            self.assertIsNone(llm_utils._get_encoding("gpt-4o"))
+            # 重试间隔内不再尝试加载
+            self.assertIsNone(llm_utils._get_encoding("gpt-4o"))
+            self.assertEqual(loader.call_count, 1)
+
+            llm_utils._encoding_failed_at["gpt-4o"] -= llm_utils.ENCODING_RETRY_INTERVAL
+            self.assertEqual(llm_utils.count_tokens("hello world", "gpt-4o"), 2)
+            self.assertEqual(loader.call_count, 2)
+
+    def test_loaded_encoding_is_reused(self):
+        with mock.patch.object(llm_utils.tiktoken, "encoding_for_model",
+                               return_value=_FakeEncoding()) as loader:
+            llm_utils.count_tokens("a b", "gpt-4o")
+            llm_utils.count_tokens("a b c", "gpt-4o")
+            self.assertEqual(loader.call_count, 1)
+
+
+class CountTokensAsyncTest(unittest.IsolatedAsyncioTestCase):
+    """异步 token 计数测试"""
+
+    async def test_matches_sync_result(self):
+        with mock.patch.object(llm_utils, "_get_encoding", return_value=_FakeEncoding()):
+            self.assertEqual(await llm_utils.count_tokens_async("a b c", "gpt-4o"), 3)
+
+
+class _FakeClient:
+    """按顺序抛出异常或返回结果的假客户端"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.chat = mock.Mock()
+        self.chat.completions.create = self._create
+
+    async def _create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+class CreateChatCompletionTest(unittest.IsolatedAsyncioTestCase):
+    """带限流与重试的模型调用测试"""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(llm_utils.rate_limiter, "acquire", mock.AsyncMock()),
+            mock.patch.object(llm_utils.asyncio, "sleep", mock.AsyncMock()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_retries_rate_limit_then_succeeds(self):
+        client = _FakeClient([_make_error(openai.RateLimitError), "ok"])
+        self.assertEqual(await llm_utils.create_chat_completion(client, model="m"), "ok")
+        self.assertEqual(client.calls, 2)
+
+    async def test_raises_after_max_attempts(self):
+        client = _FakeClient([_make_error(openai.InternalServerError) for _ in range(3)])
+        with self.assertRaises(openai.InternalServerError):
+            await llm_utils.create_chat_completion(client, max_attempts=3, model="m")
+        self.assertEqual(client.calls, 3)
+
+    async def test_does_not_retry_timeout(self):
+        client = _FakeClient([_make_error(openai.APITimeoutError), "ok"])
+        with self.assertRaises(openai.APITimeoutError):
+            await llm_utils.create_chat_completion(client, model="m")
+        self.assertEqual(client.calls, 1)
+
+    async def test_does_not_retry_client_errors(self):
+        client = _FakeClient([_make_error(openai.BadRequestError), "ok"])
+        with self.assertRaises(openai.BadRequestError):
+            await llm_utils.create_chat_completion(client, model="m")
+        self.assertEqual(client.calls, 1)
+
+
+class RetryDelayTest(unittest.TestCase):
+    """重试等待时间测试"""
+
+    def test_exponential_backoff_without_retry_after(self):
+        delay = llm_utils._retry_delay(_make_error(openai.RateLimitError), 2)
+        self.assertGreaterEqual(delay, 4)
+        self.assertLessEqual(delay, 5)
+
+    def test_retry_after_header_is_capped(self):
+        error = _make_error(openai.RateLimitError)
+        error.response = mock.Mock(headers={"retry-after": "600"})
+        delay = llm_utils._retry_delay(error, 0)
+        self.assertGreaterEqual(delay, llm_utils.MAX_RETRY_DELAY)
+        self.assertLessEqual(delay, llm_utils.MAX_RETRY_DELAY + 1)
+
+
+class RateLimiterTest(unittest.IsolatedAsyncioTestCase):
+    """令牌桶限流器测试"""
+
+    async def test_burst_up_to_capacity_then_waits(self):
+        limiter = llm_utils.RateLimiter(max_rpm=2)
+        await limiter.acquire()
+        await limiter.acquire()
+        with self.assertRaises(asyncio.TimeoutError):
+            # 桶容量为 2，第三个令牌需等待 30 秒补充
+            await asyncio.wait_for(limiter.acquire(), timeout=0.05)
+
+    async def test_tokens_refill_over_time(self):
+        limiter = llm_utils.RateLimiter(max_rpm=60)
+        limiter.tokens = 0
+        limiter.updated_at -= 1  # 模拟已经过去 1 秒，补充 1 个令牌
+        await asyncio.wait_for(limiter.acquire(), timeout=0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+日志工具类测试
+"""
+import logging
+import unittest
+
+from utils.logger_utils import log_api_call
+
+
+class _RecordCollector(logging.Handler):
+    """收集日志记录的处理器"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LogApiCallTest(unittest.IsolatedAsyncioTestCase):
+    """log_api_call 装饰器测试"""
+
+    def setUp(self):
+        self.root = logging.getLogger()
+        self.old_level = self.root.level
+        self.collector = _RecordCollector()
+        self.root.addHandler(self.collector)
+        self.root.setLevel(logging.INFO)
+
+    def tearDown(self):
+        self.root.removeHandler(self.collector)
+        self.root.setLevel(self.old_level)
+
+    async def test_success_record_carries_call_fields(self):
+        @log_api_call("/demo", "POST")
+        async def endpoint():
+            return "ok"
+
+        self.assertEqual(await endpoint(), "ok")
+
+        # INFO 级别下每次调用只输出一条结束日志
+        self.assertEqual(len(self.collector.records), 1)
+        record = self.collector.records[0]
+        self.assertEqual(record.endpoint, "/demo")
+        self.assertEqual(record.method, "POST")
+        self.assertEqual(record.status_code, 200)
+        self.assertGreaterEqual(record.response_time, 0)
+
+    async def test_error_record_carries_call_fields(self):
+        @log_api_call("/demo", "GET")
+        async def endpoint():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            await endpoint()
+
+        self.assertEqual(len(self.collector.records), 1)
+        record = self.collector.records[0]
+        self.assertEqual(record.levelno, logging.ERROR)
+        self.assertEqual(record.endpoint, "/demo")
+        self.assertEqual(record.error_type, "ValueError")
+        self.assertGreaterEqual(record.response_time, 0)
+
+    async def test_debug_level_also_logs_request_start(self):
+        self.root.setLevel(logging.DEBUG)
+
+        @log_api_call("/demo", "POST")
+        async def endpoint():
+            return "ok"
+
+        await endpoint()
+
+        self.assertEqual(len(self.collector.records), 2)
+        self.assertEqual(self.collector.records[0].endpoint, "/demo")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+提示词接口测试
+"""
+import asyncio
+import os
+import types
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from api import prompt_controller
+from utils import llm_utils
+from utils.llm_cache import LLMCache
+
+TEST_MODEL = "test-model"
+
+
+def _chunk(text):
+    """构造一条流式响应片段"""
+    delta = types.SimpleNamespace(content=text)
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta)])
+
+
+async def _fake_stream(*texts):
+    for text in texts:
+        yield _chunk(text)
+
+
+class OutputTokenBudgetTest(unittest.TestCase):
+    """输出 token 上限计算测试"""
+
+    def setUp(self):
+        patch = mock.patch.object(prompt_controller, "get_context_window", return_value=32000)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_capped_by_model_max_tokens(self):
+        self.assertEqual(prompt_controller._output_token_budget("m", 100), prompt_controller.MODEL_MAX_TOKENS)
+
+    def test_shrinks_with_input_length(self):
+        budget = prompt_controller._output_token_budget("m", 20000)
+        self.assertEqual(budget, 32000 - 20000 - prompt_controller.CONTEXT_SAFETY_MARGIN)
+
+    def test_rejects_input_that_leaves_too_little_room(self):
+        with self.assertRaises(HTTPException) as context:
+            prompt_controller._output_token_budget("m", 31000)
+        self.assertEqual(context.exception.status_code, 413)
+
+
+def _patch_model(testcase, create):
+    """替换模型调用、缓存与并发名额，create 为 create_chat_completion 的替身"""
+    patches = [
+        mock.patch.dict(os.environ, {"OPENAI_API_MODEL": TEST_MODEL}),
+        mock.patch.object(prompt_controller, "llm_cache", LLMCache()),
+        mock.patch.object(prompt_controller, "create_chat_completion", create),
+        mock.patch.object(prompt_controller, "count_tokens_async", mock.AsyncMock(return_value=10)),
+        mock.patch.object(prompt_controller, "get_client", mock.Mock()),
+        mock.patch.dict(llm_utils._semaphores, {TEST_MODEL: asyncio.Semaphore(1)}),
+    ]
+    for patch in patches:
+        patch.start()
+        testcase.addCleanup(patch.stop)
+
+
+class StreamingEndpointTest(unittest.TestCase):
+    """流式接口测试"""
+
+    def setUp(self):
+        self.create = mock.AsyncMock(side_effect=lambda *args, **kwargs: _fake_stream("你好", "世界"))
+        _patch_model(self, self.create)
+        app = FastAPI()
+        app.include_router(prompt_controller.router, prefix="/api")
+        self.client = TestClient(app)
+        self.body = {"prompt_content": "写一首诗", "dimensions": ["Clarity & Specificity"], "stream": True}
+
+    def test_streams_deltas_and_releases_slot(self):
+        response = self.client.post("/api/prompt_evaluation", json=self.body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.text,
+            'data: {"delta": "你好"}\n\ndata: {"delta": "世界"}\n\ndata: [DONE]\n\n'
+        )
+        self.assertEqual(llm_utils._semaphores[TEST_MODEL]._value, 1)
+
+    def test_returns_503_when_model_slots_are_exhausted(self):
+        # 名额已全部占用，等待超时后应在发送响应头之前返回 503
+        with mock.patch.dict(llm_utils._semaphores, {TEST_MODEL: asyncio.Semaphore(0)}), \
+                mock.patch.object(llm_utils, "QUEUE_TIMEOUT", 0.01):
+            response = self.client.post("/api/prompt_evaluation", json=self.body)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("请稍后重试", response.json()["detail"])
+        self.create.assert_not_awaited()
+
+    def test_cached_result_does_not_need_a_slot(self):
+        self.client.post("/api/prompt_evaluation", json=self.body)
+        with mock.patch.dict(llm_utils._semaphores, {TEST_MODEL: asyncio.Semaphore(0)}), \
+                mock.patch.object(llm_utils, "QUEUE_TIMEOUT", 0.01):
+            response = self.client.post("/api/prompt_evaluation", json=self.body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, 'data: {"delta": "你好世界"}\n\ndata: [DONE]\n\n')
+        self.assertEqual(self.create.await_count, 1)
+
+
+class StreamSingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    """相同流式请求合并测试"""
+
+    async def test_identical_stream_waits_for_leader(self):
+        release = asyncio.Event()
+
+        async def slow_stream(*args, **kwargs):
+            yield _chunk("你好")
+            await release.wait()
+            yield _chunk("世界")
+
+        create = mock.AsyncMock(side_effect=lambda *args, **kwargs: slow_stream())
+        _patch_model(self, create)
+        args = ("prompt_evaluation", TEST_MODEL, "system", "user", 10, 100, "key")
+
+        leader = prompt_controller._stream_model(*args)
+        self.assertIsNone(await leader.__anext__())
+        self.assertEqual(await leader.__anext__(), 'data: {"delta": "你好"}\n\n')
+
+        # 领头请求持有唯一的名额，相同请求无需名额即可就绪
+        waiter = prompt_controller._stream_model(*args)
+        self.assertIsNone(await waiter.__anext__())
+        waiter_events = asyncio.create_task(self._collect(waiter))
+        await asyncio.sleep(0)
+
+        release.set()
+        self.assertEqual(await self._collect(leader), ['data: {"delta": "世界"}\n\n', "data: [DONE]\n\n"])
+        self.assertEqual(await waiter_events, ['data: {"delta": "你好世界"}\n\n', "data: [DONE]\n\n"])
+        self.assertEqual(create.await_count, 1)
+
+    @staticmethod
+    async def _collect(events):
+        return [event async for event in events]
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+大模型响应缓存工具类
+按 (模型, 提示词内容) 的哈希做精确匹配，避免相同请求重复调用大模型
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Optional
+
+from utils.logger_utils import logger
+
+
+class LLMCache:
+    """进程内大模型响应缓存，超出容量时按 LRU 淘汰，条目超过有效期后失效"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最大缓存条目数
+            ttl: 缓存有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # 正在计算中的请求，相同键的并发请求共享同一次模型调用
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(model_name: str, *parts: str) -> str:
+        """
+        生成缓存键
+
+        Args:
+            model_name: 模型名称
+            *parts: 参与计算的提示词内容（系统提示词、用户消息等）
+
+        Returns:
+            sha256 十六进制摘要
+        """
+        digest = hashlib.sha256(model_name.encode("utf-8"))
+        for part in parts:
+            # 使用分隔符避免不同拼接方式产生相同的键
+            digest.update(b"\x00")
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，命中时刷新其 LRU 位置，过期条目视为未命中"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]],
+                             refresh: bool = False) -> str:
+        """
+        读取缓存，未命中时调用 compute 计算并写入缓存
+
+        相同键的并发请求只会触发一次 compute，其余请求等待并共享结果；
+        发起计算的请求被取消时，等待中的请求改为自行计算
+
+        Args:
+            key: 缓存键
+            compute: 计算结果的异步函数
+            refresh: 是否跳过缓存强制重新计算
+
+        Returns:
+            缓存或新计算的结果
+        """
+        while not refresh:
+            value = self.get(key)
+            if value is not None:
+                logger.business_logic("llm_cache", "命中响应缓存")
+                return value
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            logger.business_logic("llm_cache", "等待相同请求的模型调用结果")
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 当前请求自身被取消时照常抛出；仅是发起计算的请求被取消时，重新检查缓存并自行计算
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        async with self.computing(key) as future:
+            value = await compute()
+            future.set_result(value)
+            return value
+
+    def is_computing(self, key: str) -> bool:
+        """相同键是否有正在进行的计算"""
+        return key in self._inflight
+
+    @asynccontextmanager
+    async def computing(self, key: str):
+        """
+        登记一次正在进行的计算，相同键的 get_or_compute 调用会等待其结果
+
+        供无法包装为单个 compute 函数的场景（如流式输出）使用：调用方得到一个 Future，
+        计算完成后调用 set_result 写入结果，非空结果在退出时写入缓存；
+        块内抛出异常时等待方收到同一异常，未设置结果就退出（如被取消、客户端断开）时等待方改为自行计算
+
+        Args:
+            key: 缓存键
+
+        Yields:
+            asyncio.Future
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            yield future
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            # 调用 exception() 同时标记异常已被读取，避免无人等待时输出警告
+            elif not future.cancelled() and future.exception() is None and future.result():
+                self.set(key, future.result())
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+# 全局响应缓存实例
+llm_cache = LLMCache(
+    maxsize=int(os.getenv("LLM_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600"))
+)
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+大模型调用工具类
+提供共享客户端、限流、并发控制、失败重试与 token 计数功能，统一包装 chat.completions.create 调用
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import openai
+import tiktoken
+
+from utils.logger_utils import logger
+
+
+# 可重试的异常类型：限流、网络异常、服务端 5xx（读超时除外，见 create_chat_completion）
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# 单次重试的最长等待时间（秒），防止 Retry-After 过大导致请求长时间挂起
+MAX_RETRY_DELAY = 30
+
+# 常见模型的上下文窗口大小（token）
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+    "gpt-3.5-turbo": 16385,
+}
+
+# 未列出模型的默认上下文窗口大小（token）
+DEFAULT_CONTEXT_WINDOW = 128000
+
+
+class RateLimiter:
+    """令牌桶限流器，按每分钟请求数（RPM）平滑放行请求"""
+
+    def __init__(self, max_rpm: int):
+        """
+        初始化令牌桶
+
+        Args:
+            max_rpm: 每分钟允许的最大请求数，同时作为桶容量
+        """
+        self.capacity = max(1, max_rpm)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """获取一个令牌，桶空时等待令牌补充"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# 全局限流器，所有模型调用共享
+rate_limiter = RateLimiter(int(os.getenv("OPENAI_MAX_RPM", "500")))
+
+# 每个模型允许的默认最大并发调用数，可用 LLM_MAX_CONCURRENCY_<模型名> 按模型覆盖
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# 等待并发名额的最长时间（秒），超时后快速失败而不是无限排队
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+
+# 按模型名称划分的并发信号量
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+class ConcurrencyLimitError(Exception):
+    """等待模型并发名额超时"""
+
+
+def _get_semaphore(model_name: str) -> asyncio.Semaphore:
+    """
+    获取模型对应的并发信号量，首次使用时按配置创建
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        asyncio.Semaphore
+    """
+    semaphore = _semaphores.get(model_name)
+    if semaphore is None:
+        # 模型名中的 "-"、"." 等字符不能出现在环境变量名中，统一替换为下划线
+        env_name = "LLM_MAX_CONCURRENCY_" + re.sub(r"\W", "_", model_name).upper()
+        limit = int(os.getenv(env_name, str(DEFAULT_MAX_CONCURRENCY)))
+        semaphore = _semaphores[model_name] = asyncio.Semaphore(max(1, limit))
+    return semaphore
+
+
+@asynccontextmanager
+async def model_slot(model_name: str):
+    """
+    占用一个模型并发名额，退出时释放
+
+    流式调用需在整个输出过程中持有名额，因此由调用方包住完整的调用与读取过程
+
+    Args:
+        model_name: 模型名称
+
+    Raises:
+        ConcurrencyLimitError: 在 QUEUE_TIMEOUT 内未获取到名额
+    """
+    semaphore = _get_semaphore(model_name)
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"模型 {model_name} 并发已满，等待 {QUEUE_TIMEOUT:.0f} 秒仍未获取到调用名额")
+        raise ConcurrencyLimitError(f"模型 {model_name} 当前请求过多，请稍后重试") from None
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+# 全局共享的 AsyncOpenAI 客户端，首次使用时创建
+_client: Optional[openai.AsyncOpenAI] = None
+
+
+def get_client() -> openai.AsyncOpenAI:
+    """
+    获取全局共享的 AsyncOpenAI 客户端
+
+    所有请求复用同一个客户端及其底层连接池，避免每次请求重新建立 TCP/TLS 连接
+
+    Returns:
+        AsyncOpenAI 客户端
+    """
+    global _client
+    if _client is None:
+        _client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
+            max_retries=0,  # 重试由 create_chat_completion 统一处理
+            # 建连快速失败；非流式请求需等待完整生成，读超时需覆盖长输出
+            timeout=openai.Timeout(float(os.getenv("OPENAI_TIMEOUT", "300")), connect=5.0)
+        )
+    return _client
+
+
+# 编码文件加载失败后的重试间隔（秒），期间按字符数估算，避免每个请求都重新联网下载
+ENCODING_RETRY_INTERVAL = 60
+
+# 已加载的 tiktoken 编码器，按模型名称缓存，只缓存加载成功的结果
+_encodings: Dict[str, Any] = {}
+
+# 编码器最近一次加载失败的时间
+_encoding_failed_at: Dict[str, float] = {}
+
+
+def _get_encoding(model_name: str):
+    """
+    获取模型对应的 tiktoken 编码器
+
+    非 OpenAI 模型无法自动映射，使用 o200k_base 近似；编码文件加载失败（如离线环境）时返回 None，
+    并在 ENCODING_RETRY_INTERVAL 秒后重新尝试加载
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        tiktoken 编码器或 None
+    """
+    encoding = _encodings.get(model_name)
+    if encoding is not None:
+        return encoding
+    failed_at = _encoding_failed_at.get(model_name)
+    if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_INTERVAL:
+        return None
+    try:
+        try:
+            encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        _encoding_failed_at[model_name] = time.monotonic()
+        logger.warning(f"tiktoken 编码器加载失败，token 数将按字符数估算: {type(e).__name__}: {str(e)}")
+        return None
+    _encoding_failed_at.pop(model_name, None)
+    _encodings[model_name] = encoding
+    return encoding
+
+
+def count_tokens(text: str, model_name: str) -> int:
+    """
+    计算文本的 token 数
+
+    首次调用可能需要下载编码文件，异步代码中应使用 count_tokens_async
+
+    Args:
+        text: 文本内容
+        model_name: 模型名称
+
+    Returns:
+        token 数，编码器不可用时返回字符数
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+async def count_tokens_async(text: str, model_name: str) -> int:
+    """
+    在线程池中计算文本的 token 数，避免编码文件下载和长文本编码阻塞事件循环
+
+    Args:
+        text: 文本内容
+        model_name: 模型名称
+
+    Returns:
+        token 数，编码器不可用时返回字符数
+    """
+    return await asyncio.to_thread(count_tokens, text, model_name)
+
+
+def get_context_window(model_name: str) -> int:
+    """
+    获取模型的上下文窗口大小
+
+    优先使用环境变量 OPENAI_CONTEXT_WINDOW，其次查表，未知模型使用默认值
+
+    Args:
+        model_name: 模型名称
+
+    Returns:
+        上下文窗口大小（token）
+    """
+    configured = os.getenv("OPENAI_CONTEXT_WINDOW")
+    if configured:
+        return int(configured)
+    return MODEL_CONTEXT_WINDOWS.get(model_name, DEFAULT_CONTEXT_WINDOW)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    计算重试等待时间
+
+    优先使用服务端返回的 Retry-After 头，否则按指数退避计算，
+    并叠加随机抖动，避免并发请求同时重试再次触发限流
+
+    Args:
+        error: 本次调用抛出的异常
+        attempt: 已失败的次数（从 0 开始）
+
+    Returns:
+        等待秒数
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        delay = float(retry_after) if retry_after else float(2 ** attempt)
+    except ValueError:
+        # Retry-After 也可能是 HTTP 日期格式，此时退回指数退避
+        delay = float(2 ** attempt)
+    return min(delay, MAX_RETRY_DELAY) + random.uniform(0, 1)
+
+
+async def create_chat_completion(client: openai.AsyncOpenAI, max_attempts: int = 3, **kwargs):
+    """
+    带限流与指数退避重试的 chat.completions.create 调用
+
+    Args:
+        client: AsyncOpenAI 客户端
+        max_attempts: 最大尝试次数
+        **kwargs: 透传给 chat.completions.create 的参数
+
+    Returns:
+        模型响应对象
+    """
+    for attempt in range(max_attempts):
+        await rate_limiter.acquire()
+        try:
+            return await client.chat.completions.create(**kwargs)
+        except openai.APITimeoutError:
+            # 超时异常属于 APIConnectionError，但单次等待已长达 OPENAI_TIMEOUT，
+            # 重试会让请求及其并发名额被占用数倍时长，直接失败
+            raise
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"模型调用失败，{delay:.1f}秒后重试 ({attempt + 1}/{max_attempts}): {type(e).__name__}: {str(e)}")
+            await asyncio.sleep(delay)
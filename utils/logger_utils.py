@@ -5,11 +5,60 @@
 """
 import logging
 import json
-from datetime import datetime
+import time
 from typing import Dict, Any, Optional
 from functools import wraps
 
 
+# 时间函数绑定为模块级名称，省去每次调用时对 time 模块的属性查找
+_time_ns = time.time_ns
+_strftime = time.strftime
+_localtime = time.localtime
+
+# 最近一次格式化的 (整秒时间戳, 精确到秒的时间字符串)，同一秒内的日志复用
+_ts_cache = (0, "")
+
+
+def _fast_ts() -> str:
+    """
+    获取精确到毫秒的当前时间字符串，格式：%Y-%m-%d %H:%M:%S.毫秒
+
+    秒级部分按秒缓存，同一秒内只需拼接毫秒
+
+    Returns:
+        时间字符串
+    """
+    global _ts_cache
+    # 使用整数纳秒计算秒和毫秒，避免浮点运算与舍入误差
+    seconds, nanos = divmod(_time_ns(), 1_000_000_000)
+    cached_seconds, cached_str = _ts_cache
+    if seconds != cached_seconds:
+        cached_str = _strftime('%Y-%m-%d %H:%M:%S', _localtime(seconds))
+        # 整体替换元组，其他线程读取时不会拿到不一致的两部分
+        _ts_cache = (seconds, cached_str)
+    return f"{cached_str}.{nanos // 1_000_000:03d}"
+
+
+# 所有日志共用的固定额外字段，模块加载时构建一次
+# 无额外参数时直接复用该字典，logging 只读取 extra 不会修改
+_BASE_EXTRA = {
+    'app_name': 'prompt-word-optimization',
+    'env': 'test',
+    'level': 6,  # INFO level
+    'level_name': 'INFO',
+    'log_type': 'Python',
+    'logger_name': 'prompt-word-optimization.logger',
+    'marker': 'AI-AGENT',
+    'thread_name': 'MainThread',
+}
+
+# 允许从调用参数写入日志的额外字段，其余参数不输出，避免添加过多信息
+_EXTRA_FIELDS = (
+    'thread_name', 'method', 'endpoint', 'client_ip',
+    'status_code', 'response_time', 'error_type',
+)
+
+
 class StructuredLogger:
     """结构化日志记录器"""
     
@@ -29,14 +78,19 @@ class StructuredLogger:
         self.logger.setLevel(logging.INFO)
         
         # 确保使用根日志记录器的处理器
-        root_logger = logging.getLogger()
+        # 根日志记录器全局唯一，缓存下来避免每条日志都调用 getLogger
+        self._root = logging.getLogger()
         if not self.logger.handlers:
             # 如果当前记录器没有处理器，则使用根记录器的处理器
-            for handler in root_logger.handlers:
+            for handler in self._root.handlers:
                 self.logger.addHandler(handler)
         
-        # 确保日志级别设置正确
-        self.logger.setLevel(logging.INFO)
+        # 各级别日志消息中时间戳之后的固定前缀，初始化时拼接一次
+        self._prefix_debug = f" [ss-log] [MainThread] DEBUG [{self.service_name}.logger] "
+        self._prefix_info = f" [ss-log] [MainThread] INFO [{self.service_name}.logger] "
+        self._prefix_warning = f" [ss-log] [MainThread] WARNING [{self.service_name}.logger] "
+        self._prefix_error = f" [ss-log] [MainThread] ERROR [{self.service_name}.logger] "
+        self._prefix_critical = f" [ss-log] [MainThread] CRITICAL [{self.service_name}.logger] "
     
     def _get_base_extra(self, **kwargs) -> Dict[str, Any]:
         """
@@ -46,63 +100,69 @@ class StructuredLogger:
             **kwargs: 额外的字段
             
         Returns:
-            包含基础字段的字典
+            包含基础字段的字典，无额外参数时返回共享字典，调用方不应修改
         """
-        base_extra = {
-            'app_name': 'prompt-word-optimization',
-            'env': 'test',
-            'level': 6,  # INFO level
-            'level_name': 'INFO',
-            'log_type': 'Python',
-            'logger_name': f'{self.service_name}.logger',
-            'marker': 'AI-AGENT',
-            'thread_name': kwargs.get('thread_name', 'MainThread')
-        }
+        if not kwargs:
+            return _BASE_EXTRA
+        base_extra = dict(_BASE_EXTRA)
         # 只添加特定的额外字段，避免添加过多信息
-        if 'method' in kwargs:
-            base_extra['method'] = kwargs['method']
+        for key in _EXTRA_FIELDS:
+            value = kwargs.get(key)
+            if value is not None:
+                base_extra[key] = value
         return base_extra
     
     def info(self, message: str, **kwargs):
         """记录 INFO 级别日志"""
-        extra = self._get_base_extra(**kwargs)
         # 使用根日志记录器确保消息被正确发送到Graylog
-        root_logger = logging.getLogger()
+        root_logger = self._root
+        # 级别未启用时直接返回，不再构造额外字段和消息
+        if not root_logger.isEnabledFor(logging.INFO):
+            return
+        extra = self._get_base_extra(**kwargs)
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.info(f"{timestamp} [ss-log] [MainThread] INFO [{self.service_name}.logger] {message}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.info("%s%s%s", timestamp, self._prefix_info, message, extra=extra)
     
     def debug(self, message: str, **kwargs):
         """记录 DEBUG 级别日志"""
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.DEBUG):
+            return
         extra = self._get_base_extra(**kwargs)
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.debug(f"{timestamp} [ss-log] [MainThread] DEBUG [{self.service_name}.logger] {message}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.debug("%s%s%s", timestamp, self._prefix_debug, message, extra=extra)
     
     def warning(self, message: str, **kwargs):
         """记录 WARNING 级别日志"""
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.WARNING):
+            return
         extra = self._get_base_extra(**kwargs)
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.warning(f"{timestamp} [ss-log] [MainThread] WARNING [{self.service_name}.logger] {message}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.warning("%s%s%s", timestamp, self._prefix_warning, message, extra=extra)
     
     def error(self, message: str, **kwargs):
         """记录 ERROR 级别日志"""
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.ERROR):
+            return
         extra = self._get_base_extra(**kwargs)
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.error(f"{timestamp} [ss-log] [MainThread] ERROR [{self.service_name}.logger] {message}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.error("%s%s%s", timestamp, self._prefix_error, message, extra=extra)
     
     def critical(self, message: str, **kwargs):
         """记录 CRITICAL 级别日志"""
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.CRITICAL):
+            return
         extra = self._get_base_extra(**kwargs)
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.critical(f"{timestamp} [ss-log] [MainThread] CRITICAL [{self.service_name}.logger] {message}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.critical("%s%s%s", timestamp, self._prefix_critical, message, extra=extra)
     
     def api_request(self, endpoint: str, method: str, client_ip: str = None, 
                    request_data: Dict[str, Any] = None, **kwargs):
@@ -116,6 +176,9 @@ class StructuredLogger:
             request_data: 请求数据
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.INFO):
+            return
         extra = self._get_base_extra(
             log_type='api_request',
             endpoint=endpoint,
@@ -124,10 +187,9 @@ class StructuredLogger:
             request_data=request_data,
             **kwargs
         )
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.info(f"{timestamp} [ss-log] [MainThread] INFO [{self.service_name}.logger] ==> Preparing: {method} {endpoint}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.info("%s%s==> Preparing: %s %s", timestamp, self._prefix_info, method, endpoint, extra=extra)
     
     def api_response(self, endpoint: str, method: str, status_code: int, 
                     response_time: float = None, **kwargs):
@@ -141,6 +203,9 @@ class StructuredLogger:
             response_time: 响应时间（秒）
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.INFO):
+            return
         extra = self._get_base_extra(
             log_type='api_response',
             endpoint=endpoint,
@@ -149,10 +214,9 @@ class StructuredLogger:
             response_time=response_time,
             **kwargs
         )
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.info(f"{timestamp} [ss-log] [MainThread] INFO [{self.service_name}.logger] <== Total: {status_code} - {method} {endpoint}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.info("%s%s<== Total: %s - %s %s", timestamp, self._prefix_info, status_code, method, endpoint, extra=extra)
     
     def api_error(self, endpoint: str, method: str, error: str, 
                  error_type: str = None, **kwargs):
@@ -166,6 +230,9 @@ class StructuredLogger:
             error_type: 错误类型
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.ERROR):
+            return
         extra = self._get_base_extra(
             log_type='api_error',
             endpoint=endpoint,
@@ -174,10 +241,9 @@ class StructuredLogger:
             error_type=error_type,
             **kwargs
         )
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.error(f"{timestamp} [ss-log] [MainThread] ERROR [{self.service_name}.logger] ==> Parameters: {error}(String), {method}(String), {endpoint}(String)", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.error("%s%s==> Parameters: %s(String), %s(String), %s(String)", timestamp, self._prefix_error, error, method, endpoint, extra=extra)
     
     def database_operation(self, operation: str, table: str = None, 
                           affected_rows: int = None, **kwargs):
@@ -190,6 +256,9 @@ class StructuredLogger:
             affected_rows: 影响的行数
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.INFO):
+            return
         extra = self._get_base_extra(
             log_type='database_operation',
             operation=operation,
@@ -197,10 +266,9 @@ class StructuredLogger:
             affected_rows=affected_rows,
             **kwargs
         )
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.info(f"{timestamp} [ss-log] [MainThread] INFO [{self.service_name}.logger] ==> Preparing: {operation} {table or ''}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.info("%s%s==> Preparing: %s %s", timestamp, self._prefix_info, operation, table or '', extra=extra)
     
     def model_inference(self, model_name: str, input_tokens: int = None, 
                        output_tokens: int = None, response_time: float = None, **kwargs):
@@ -214,6 +282,9 @@ class StructuredLogger:
             response_time: 响应时间（秒）
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.INFO):
+            return
         extra = self._get_base_extra(
             log_type='model_inference',
             model_name=model_name,
@@ -222,10 +293,9 @@ class StructuredLogger:
             response_time=response_time,
             **kwargs
         )
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.info(f"{timestamp} [ss-log] [MainThread] INFO [{self.service_name}.logger] ==> Preparing: {model_name}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.info("%s%s==> Preparing: %s", timestamp, self._prefix_info, model_name, extra=extra)
     
     def business_logic(self, operation: str, details: str = None, **kwargs):
         """
@@ -236,17 +306,19 @@ class StructuredLogger:
             details: 详细信息
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.INFO):
+            return
         extra = self._get_base_extra(
             log_type='business_logic',
             operation=operation,
             details=details,
             **kwargs
         )
-        root_logger = logging.getLogger()
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
+        timestamp = _fast_ts()  # 精确到毫秒
         details_info = f" - {details}" if details else ""
-        root_logger.info(f"{timestamp} [ss-log] [MainThread] INFO [{self.service_name}.logger] ==> Preparing: {operation}{details_info}", extra=extra)
+        root_logger.info("%s%s==> Preparing: %s%s", timestamp, self._prefix_info, operation, details_info, extra=extra)
     
     def parameters(self, *params, **kwargs):
         """
@@ -256,42 +328,35 @@ class StructuredLogger:
             *params: 参数列表，每个参数可以是字符串或元组(值, 类型)
             **kwargs: 其他额外字段
         """
+        root_logger = self._root
+        if not root_logger.isEnabledFor(logging.DEBUG):
+            return
         extra = self._get_base_extra(
             log_type='parameters',
             **kwargs
         )
         
-        # 格式化参数
-        formatted_params = []
-        for param in params:
-            if isinstance(param, tuple) and len(param) == 2:
-                value, param_type = param
-                formatted_params.append(f"{value}({param_type})")
-            else:
-                formatted_params.append(f"{param}(String)")
-        
-        param_string = ", ".join(formatted_params)
-        root_logger = logging.getLogger()
+        # 格式化参数，不含 (值, 类型) 元组时直接按 String 拼接
+        if not any(isinstance(param, tuple) for param in params):
+            param_string = ", ".join(f"{param}(String)" for param in params)
+        else:
+            formatted_params = []
+            for param in params:
+                if isinstance(param, tuple) and len(param) == 2:
+                    value, param_type = param
+                    formatted_params.append(f"{value}({param_type})")
+                else:
+                    formatted_params.append(f"{param}(String)")
+            
+            param_string = ", ".join(formatted_params)
         # 手动添加时间戳
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]  # 精确到毫秒
-        root_logger.debug(f"{timestamp} [ss-log] [MainThread] DEBUG [{self.service_name}.logger] ==> Parameters: {param_string}", extra=extra)
+        timestamp = _fast_ts()  # 精确到毫秒
+        root_logger.debug("%s%s==> Parameters: %s", timestamp, self._prefix_debug, param_string, extra=extra)
 
 
 # 创建全局日志记录器实例
 logger = StructuredLogger()
 
-# 确保全局日志记录器使用根日志记录器的处理器
-def ensure_logger_handlers():
-    """确保全局日志记录器使用根日志记录器的处理器"""
-    root_logger = logging.getLogger()
-    if root_logger.handlers and not logger.logger.handlers:
-        for handler in root_logger.handlers:
-            logger.logger.addHandler(handler)
-        logger.logger.setLevel(logging.INFO)
-
-# 初始化处理器
-ensure_logger_handlers()
-
 
 def log_api_call(endpoint: str, method: str = "POST"):
     """
@@ -304,33 +369,36 @@ def log_api_call(endpoint: str, method: str = "POST"):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # 获取请求对象
-            request = None
-            for arg in args:
-                if hasattr(arg, 'client') and hasattr(arg, 'method'):
-                    request = arg
-                    break
-            
-            client_ip = "unknown"
-            if request and hasattr(request, 'client') and request.client:
-                client_ip = request.client.host
+            # INFO 级别未启用时只保留错误日志，跳过请求解析、计时和请求/响应日志
+            if not logger._root.isEnabledFor(logging.INFO):
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    logger.api_error(
+                        endpoint=endpoint,
+                        method=method,
+                        error=str(e),
+                        error_type=type(e).__name__
+                    )
+                    raise
             
-            start_time = datetime.now()
+            # 使用单调时钟计时，不受系统时间调整影响
+            start_time = time.perf_counter()
             
-            # 记录API请求日志
-            logger.api_request(
-                endpoint=endpoint,
-                method=method,
-                client_ip=client_ip,
-                status="processing"
-            )
+            # 请求开始日志只在 DEBUG 级别输出，INFO 级别下每个请求只在结束时记录一条日志
+            if logger._root.isEnabledFor(logging.DEBUG):
+                logger.api_request(
+                    endpoint=endpoint,
+                    method=method,
+                    status="processing"
+                )
             
             try:
                 # 执行原函数
                 result = await func(*args, **kwargs)
                 
                 # 计算响应时间
-                response_time = (datetime.now() - start_time).total_seconds()
+                response_time = time.perf_counter() - start_time
                 
                 # 记录成功的API响应
                 logger.api_response(
@@ -344,7 +412,7 @@ def log_api_call(endpoint: str, method: str = "POST"):
                 
             except Exception as e:
                 # 计算响应时间
-                response_time = (datetime.now() - start_time).total_seconds()
+                response_time = time.perf_counter() - start_time
                 
                 # 记录错误响应
                 logger.api_error(